@@ -24,13 +24,11 @@
 # ******************************************************************************
 
 import time
-import signal
-import jack
 import logging
 from bisect import bisect
 from copy import deepcopy
 from functools import partial
-import multiprocessing as mp
+import queue
 from threading import Thread, RLock, Event
 
 from zynlibs.zynseq import zynseq
@@ -217,6 +215,9 @@ FN_REMOVE_PATTERN                    = 0x0F
 FN_SELECT_PATTERN                    = 0x10
 FN_CLEAR_PATTERN                     = 0x11
 
+# Mixer strip symbol -> track-buttons function
+_STRIP_SYMBOL_FN = {"mute": FN_MUTE, "solo": FN_SOLO}
+
 
 # --------------------------------------------------------------------------
 # 'Akai APC mini mk2' device controller class
@@ -275,10 +276,15 @@ class zynthian_ctrldev_akai_apc_mini_mk2(zynthian_ctrldev_zynmixer, zynthian_ctr
         super().end()
 
     def refresh(self):
-        # PadMatrix is handled in volume/pan modes (when mixer handler is active)
-        self._current_handler.refresh()
-        if self._current_handler == self._mixer_handler:
-            self._padmatrix_handler.refresh()
+        # Batch all LED updates of this frame into a single write burst
+        self._leds.batch_start()
+        try:
+            # PadMatrix is handled in volume/pan modes (when mixer handler is active)
+            self._current_handler.refresh()
+            if self._current_handler == self._mixer_handler:
+                self._padmatrix_handler.refresh()
+        finally:
+            self._leds.batch_end()
 
     def midi_event(self, ev):
         if self._on_midi_event(ev):
@@ -447,6 +453,40 @@ class FeedbackLEDs:
         self._state = {}
         self._timer = RunTimer()
 
+        # Pending writes of the current frame and last state written to the
+        # device, used to send only real changes and batch them per frame
+        self._pending = {}
+        self._hw_state = {}
+        self._batching = False
+        # LED writes come from the refresh handlers and from RunTimer's
+        # thread (delayed/overlay actions), so the batching state is shared
+        self._lock = RLock()
+
+    def batch_start(self):
+        with self._lock:
+            self._batching = True
+
+    def batch_end(self):
+        with self._lock:
+            self._batching = False
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            for led, (color, brightness) in self._pending.items():
+                self._hw_state[led] = (color, brightness)
+                lib_zyncore.dev_send_note_on(self._idev, brightness, led, color)
+            self._pending.clear()
+
+    def _send(self, led, color, brightness):
+        with self._lock:
+            if self._hw_state.get(led) == (color, brightness):
+                self._pending.pop(led, None)
+                return
+            self._pending[led] = (color, brightness)
+            if not self._batching:
+                self.flush()
+
     def all_off(self):
         self.control_leds_off()
         self.pad_leds_off()
@@ -471,19 +511,19 @@ class FeedbackLEDs:
 
     def led_off(self, led, overlay=False):
         self._timer.remove(led)
-        lib_zyncore.dev_send_note_on(self._idev, 0, led, 0)
+        self._send(led, 0, 0)
         if not overlay:
             self._state[led] = (0, 0)
 
     def led_on(self, led, color=1, brightness=0, overlay=False):
         self._timer.remove(led)
-        lib_zyncore.dev_send_note_on(self._idev, brightness, led, color)
+        self._send(led, color, brightness)
         if not overlay:
             self._state[led] = (color, brightness)
 
     def led_blink(self, led):
         self._timer.remove(led)
-        lib_zyncore.dev_send_note_on(self._idev, 0, led, 2)
+        self._send(led, 2, 0)
 
     def remove_overlay(self, led):
         old_state = self._state.get(led)
@@ -491,7 +531,7 @@ class FeedbackLEDs:
             self.led_on(led, *old_state)
         else:
             self._timer.remove(led)
-            lib_zyncore.dev_send_note_on(self._idev, 0, led, 0)
+            self._send(led, 0, 0)
 
     def delayed(self, action, timeout, led, *args, **kwargs):
         action = getattr(self, action)
@@ -540,6 +580,34 @@ class DeviceHandler(ModeHandlerBase):
 
         self._btn_states = {k:-1 for k in self._btn_actions}
 
+        # Note -> action dispatch table, used on every (unshifted) NOTE-ON
+        send_cuia = self._state_manager.send_cuia
+        self._note_dispatch = {
+            BTN_UP:        partial(send_cuia, "ARROW_UP"),
+            BTN_PAD_UP:    partial(send_cuia, "ARROW_UP"),
+            BTN_DOWN:      partial(send_cuia, "ARROW_DOWN"),
+            BTN_PAD_DOWN:  partial(send_cuia, "ARROW_DOWN"),
+            BTN_LEFT:      partial(send_cuia, "ARROW_LEFT"),
+            BTN_PAD_LEFT:  partial(send_cuia, "ARROW_LEFT"),
+            BTN_RIGHT:     partial(send_cuia, "ARROW_RIGHT"),
+            BTN_PAD_RIGHT: partial(send_cuia, "ARROW_RIGHT"),
+            BTN_SEL_YES:   partial(send_cuia, "V5_ZYNPOT_SWITCH", [3, 'S']),
+            BTN_BACK_NO:   partial(send_cuia, "BACK"),
+            BTN_ALT:       self._toggle_alt_mode,
+            BTN_F1:        partial(self._program_change, 1),
+            BTN_F2:        partial(self._program_change, 2),
+            BTN_F3:        partial(self._program_change, 3),
+            BTN_F4:        partial(self._program_change, 4),
+        }
+
+        # Knob -> zynpot mapping, used on every CC event
+        self._knob_zynpot = {
+            KNOB_LAYER: 0,
+            KNOB_BACK: 1,
+            KNOB_SNAPSHOT: 2,
+            KNOB_SELECT: 3,
+        }
+
     def refresh(self):
         self._leds.all_off()
 
@@ -577,31 +645,10 @@ class DeviceHandler(ModeHandlerBase):
                 self.refresh()
                 return True
         else:
-            if note in (BTN_UP, BTN_PAD_UP):
-                self._state_manager.send_cuia("ARROW_UP")
-            elif note in (BTN_DOWN, BTN_PAD_DOWN):
-                self._state_manager.send_cuia("ARROW_DOWN")
-            elif note in (BTN_LEFT, BTN_PAD_LEFT):
-                self._state_manager.send_cuia("ARROW_LEFT")
-            elif note in (BTN_RIGHT, BTN_PAD_RIGHT):
-                self._state_manager.send_cuia("ARROW_RIGHT")
-            elif note == BTN_SEL_YES:
-                self._state_manager.send_cuia("V5_ZYNPOT_SWITCH", [3, 'S'])
-            elif note == BTN_BACK_NO:
-                self._state_manager.send_cuia("BACK")
-            elif note == BTN_ALT:
-                self._is_alt_active = not self._is_alt_active
-                self._state_manager.send_cuia("TOGGLE_ALT_MODE")
-                self.refresh()
+            handler = self._note_dispatch.get(note)
+            if handler is not None:
+                handler()
             else:
-                # Function buttons (F1-F4)
-                fn_btns = {BTN_F1: 1, BTN_F2: 2, BTN_F3: 3, BTN_F4: 4}
-                pgm = fn_btns.get(note)
-                if pgm is not None:
-                    pgm += 4 if self._is_alt_active else 0
-                    self._state_manager.send_cuia("PROGRAM_CHANGE", [pgm])
-                    return True
-
                 # Buttons that may have bold/long press
                 self._btn_timer.is_pressed(note, time.time())
             return True
@@ -610,17 +657,23 @@ class DeviceHandler(ModeHandlerBase):
         self._on_shifted_override(shifted_override)
         self._btn_timer.is_released(note)
 
+    def _toggle_alt_mode(self):
+        self._is_alt_active = not self._is_alt_active
+        self._state_manager.send_cuia("TOGGLE_ALT_MODE")
+        self.refresh()
+
+    def _program_change(self, pgm):
+        # Function buttons (F1-F4), shifted to F5-F8 in ALT mode
+        if self._is_alt_active:
+            pgm += 4
+        self._state_manager.send_cuia("PROGRAM_CHANGE", [pgm])
+
     def cc_change(self, ccnum, ccval):
         delta = self._knobs_ease.feed(ccnum, ccval, self._is_shifted)
         if delta is None:
             return
 
-        zynpot = {
-            KNOB_LAYER: 0,
-            KNOB_BACK: 1,
-            KNOB_SNAPSHOT: 2,
-            KNOB_SELECT: 3
-        }.get(ccnum, None)
+        zynpot = self._knob_zynpot.get(ccnum)
         if zynpot is None:
             return
 
@@ -825,7 +878,7 @@ class MixerHandler(ModeHandlerBase):
             return self._update_pan(ccnum, ccval)
 
     def update_strip(self, chan, symbol, value):
-        if {"mute": FN_MUTE, "solo": FN_SOLO}.get(symbol) != self._track_buttons_function:
+        if _STRIP_SYMBOL_FN.get(symbol) != self._track_buttons_function:
             return
         chan -= self._chains_bank * 8
         if 0 > chan > 8:
@@ -973,6 +1026,11 @@ class PadMatrixHandler(ModeHandlerBase):
             for r in range(self._rows):
                 self._pads.append(BTN_PAD_END - (r * self._cols + c))
 
+        # Direct pad-note -> pad-index lookup, used on every pad press
+        self._pad_index = tuple(
+            self._pads.index(note) if note in self._pads else None
+            for note in range(128))
+
     def on_record_changed(self, state):
         self._is_record_pressed = state
         if state and self._recording_seq:
@@ -1143,7 +1201,9 @@ class PadMatrixHandler(ModeHandlerBase):
             self._refresh_tool_buttons()
 
     def get_sequence_from_pad(self, pad):
-        index = self._pads.index(pad)
+        index = self._pad_index[pad]
+        if index is None:
+            return None
         col = index // self._rows
         row = index % self._rows
 
@@ -1329,23 +1389,22 @@ class PadMatrixHandler(ModeHandlerBase):
 #  Jack client for playback sync
 # --------------------------------------------------------------------------
 #
-# NOTE: This is not a thread to avoid overloading the whole system
 # FIXME: make this a C service and use a FIFO for IPC
 #        or a library with a thread accessed using ctypes
 #        https://docs.python.org/3.7/library/ctypes.html
-class StepSyncProvider(mp.Process):
+class StepSyncProvider(Thread):
     def __init__(self, steps_per_beat, step_callback):
-        """NOTE: This constructor will be called in the old process."""
         super().__init__()
-        self._commands = mp.Queue()
-        self._steps = mp.Queue()
+        self._commands = queue.Queue()
+        self._steps = queue.Queue()
         self._spb = steps_per_beat
         self._tick_counter = 0
+        self._jack_client = None
 
         # Create a new thread to read steps and call sync callback
         StepSyncConsumer(self._steps, step_callback)
 
-        # IPC methods
+        # Command methods
         self.enable = partial(self._enqueue_cmd, "enable", True)
         self.disable = partial(self._enqueue_cmd, "enable", False)
         self.stop = partial(self._enqueue_cmd, "stop")
@@ -1354,15 +1413,14 @@ class StepSyncProvider(mp.Process):
         self.daemon = True
         self.start()
 
-    def _init(self):
-        """NOTE: This _init() is called inside the new process."""
-        signal.signal(signal.SIGINT, self._on_interrupt)
-        signal.signal(signal.SIGTERM, self._on_interrupt)
-        signal.signal(signal.SIGHUP, self._on_interrupt)
-
-    # Process worker
+    # Thread worker
     def run(self):
-        self._init()
+        # Deferred import: only this sync client needs the jack binding
+        import jack
+
+        # Decode incoming MIDI on a dedicated thread, off the RT callback
+        self._raw_events = queue.Queue(maxsize=1024)
+        Thread(target=self._midi_worker, daemon=True).start()
 
         self._jack_client = jack.Client("StepSeq-Monitor")
         self._inport = self._jack_client.midi_inports.register("input")
@@ -1378,6 +1436,11 @@ class StepSyncProvider(mp.Process):
             elif cmd[0] == "enable":
                 self._cmd_enable(cmd[1])
 
+        if self._jack_client:
+            self._jack_client.deactivate()
+            self._jack_client.close()
+            self._jack_client = None
+
     # Internal commands
     def _cmd_enable(self, enable):
         if self._jack_client is None:
@@ -1390,21 +1453,14 @@ class StepSyncProvider(mp.Process):
         else:
             self._jack_client.deactivate()
 
-    # For simple IPC methods
+    # For simple command passing
     def _enqueue_cmd(self, cmd, *args):
         self._commands.put([cmd] + list(args))
 
-    def _on_interrupt(self, signum, frame):
-        if self._jack_client:
-            self._jack_client.deactivate()
-            self._jack_client.close()
-            self._jack_client = None
-        self.stop()
-
-    # Jack events processor
-    def _process(self, nframes):
-        for offset, data in self._inport.incoming_midi_events():
-            data = bytes(data)
+    # MIDI decoding worker, runs outside the JACK RT thread
+    def _midi_worker(self):
+        while True:
+            data = self._raw_events.get()
             ev = data[0]
 
             # 'Continue' is sent on every bar end
@@ -1418,6 +1474,15 @@ class StepSyncProvider(mp.Process):
                     self._steps.put("S")
                     self._tick_counter = 0
 
+    # Jack events processor: just hand the raw bytes over to the worker, any
+    # further Python-level work here would stall the audio graph
+    def _process(self, nframes):
+        for offset, data in self._inport.incoming_midi_events():
+            try:
+                self._raw_events.put_nowait(bytes(data))
+            except queue.Full:
+                pass
+
 
 # --------------------------------------------------------------------------
 #  Step Sequencer clock sync
@@ -1508,6 +1573,11 @@ class StepSeqState:
 #  Note objects used in NotePlayer's event queue
 # --------------------------------------------------------------------------
 class Note:
+    # Slotted: these objects are allocated and dereferenced on every player
+    # tick, so keep attribute access slot-based instead of __dict__-based
+    __slots__ = ("_duration", "_stutter_count", "_stutter_duration", "_velocity",
+                 "_elapsed", "_is_stopped", "_is_finished", "_iter", "note", "channel")
+
     def __init__(self, note, velocity, duration_cycles, channel, stutt_count, stutt_duration):
         self._duration = duration_cycles
         self._stutter_count = stutt_count
@@ -1704,6 +1774,20 @@ class StepSeqHandler(ModeHandlerBase):
         self._pressed_pads = {}
         self._pressed_pads_action = None
 
+        # Knob -> adjust-function tables, used on every CC event
+        self._adjust_pad_funcs = {
+            KNOB_1: self._update_note_pad_duration,
+            KNOB_2: self._update_note_pad_velocity,
+            KNOB_3: self._update_note_pad_stutter_count,
+            KNOB_4: self._update_note_pad_stutter_duration,
+        }
+        self._adjust_step_funcs = {
+            KNOB_1: self._update_step_duration,
+            KNOB_2: self._update_step_velocity,
+            KNOB_3: self._update_step_stutter_count,
+            KNOB_4: self._update_step_stutter_duration,
+        }
+
     def set_state(self, state):
         state = state.get("stepseq")
         if state is None:
@@ -1981,18 +2065,8 @@ class StepSeqHandler(ModeHandlerBase):
             if self._note_config is not None:
                 return False
 
-            adjust_pad_func = {
-                KNOB_1: self._update_note_pad_duration,
-                KNOB_2: self._update_note_pad_velocity,
-                KNOB_3: self._update_note_pad_stutter_count,
-                KNOB_4: self._update_note_pad_stutter_duration,
-            }.get(ccnum)
-            adjust_step_func = {
-                KNOB_1: self._update_step_duration,
-                KNOB_2: self._update_step_velocity,
-                KNOB_3: self._update_step_stutter_count,
-                KNOB_4: self._update_step_stutter_duration,
-            }.get(ccnum)
+            adjust_pad_func = self._adjust_pad_funcs.get(ccnum)
+            adjust_step_func = self._adjust_step_funcs.get(ccnum)
 
             step_pads = self._pads[:self._used_pads]
             self._pressed_pads_action = "knobs"
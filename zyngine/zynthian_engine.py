@@ -26,19 +26,84 @@ import os
 import re
 import json
 import glob
-import liblo
+import shlex
 import logging
-import pexpect
 import fnmatch
+import subprocess
 from time import sleep
 from string import Template
+from threading import Timer
+from functools import lru_cache
+from collections import defaultdict
 from os.path import isfile, isdir, ismount, join
 
+try:
+	import orjson
+except ImportError:
+	orjson = None
+
 import zynautoconnect
 from . import zynthian_controller
 from zyngui import zynthian_gui_config
 from zyncoder.zyncore import lib_zyncore
 
+# --------------------------------------------------------------------------------
+# Directory listing cache for get_filelist & get_dirlist
+# --------------------------------------------------------------------------------
+
+# Cached listings, keyed by (dpath dirs, fext/exclude_empty) and invalidated
+# when any of the scanned directories' mtime changes
+_listing_cache = {}
+_listing_cache_maxlen = 64
+
+
+def _get_dir_mtimes(dpath):
+	# Get a tuple with the mtime of each directory (None if not accessible)
+	mtimes = []
+	for dpd in dpath:
+		try:
+			mtimes.append(os.stat(dpd[1]).st_mtime_ns)
+		except OSError:
+			mtimes.append(None)
+	return tuple(mtimes)
+
+
+def _get_cached_listing(key, mtimes):
+	try:
+		cached_mtimes, res = _listing_cache[key]
+	except KeyError:
+		return None
+	if cached_mtimes != mtimes:
+		return None
+	# Return a fresh copy so callers can safely modify the rows
+	return [row[:] for row in res]
+
+
+def _store_cached_listing(key, mtimes, res):
+	if len(_listing_cache) >= _listing_cache_maxlen:
+		_listing_cache.pop(next(iter(_listing_cache)))
+	_listing_cache[key] = (mtimes, [row[:] for row in res])
+
+
+# Compiled OSC path templates, cached per unique spec string
+@lru_cache(maxsize=512)
+def _compile_osc_template(spec):
+	return Template(spec)
+
+
+# Translation table to prettify filenames into titles
+_UNDERSCORE_TO_SPACE = str.maketrans('_', ' ')
+
+
+# Compiled preset file-extension rule, cached per extension set
+@lru_cache(maxsize=32)
+def _compile_preset_fexts_rule(fexts):
+	rules = []
+	for ext in fexts:
+		rules.append(fnmatch.translate("*." + ext))
+	return re.compile("(" + "|".join(rules) + ")", re.IGNORECASE)
+
+
 # --------------------------------------------------------------------------------
 # Basic Engine Class: Spawn a process & manage IPC communication using pexpect
 # --------------------------------------------------------------------------------
@@ -76,6 +141,8 @@ class zynthian_basic_engine:
 
 	def start(self):
 		if not self.proc:
+			# Deferred import: saves startup time & RSS when no engine runs
+			import pexpect
 			logging.info("Starting Engine {}".format(self.name))
 			try:
 				logging.debug("Command: {}".format(self.command))
@@ -130,6 +197,84 @@ class zynthian_basic_engine:
 			return out
 
 
+# --------------------------------------------------------------------------------
+# Basic Engine Class variant using subprocess & literal prompt matching
+# + Suitable for engines whose command prompt is a fixed string: output is
+#   matched with bytes.endswith instead of pexpect's regex scan of the whole
+#   accumulated buffer on every read
+# --------------------------------------------------------------------------------
+
+
+class zynthian_basic_engine_subproc(zynthian_basic_engine):
+
+	def start(self):
+		if not self.proc:
+			logging.info("Starting Engine {}".format(self.name))
+			try:
+				logging.debug("Command: {}".format(self.command))
+
+				# Keep environment's PWD consistent with cwd, as done for pexpect
+				if self.command_cwd:
+					self.command_env['PWD'] = self.command_cwd
+
+				self.proc = subprocess.Popen(shlex.split(self.command), stdin=subprocess.PIPE,
+					stdout=subprocess.PIPE, stderr=subprocess.STDOUT, bufsize=0,
+					env=self.command_env, cwd=self.command_cwd)
+				output = self.proc_get_output()
+
+				if self.proc_start_sleep:
+					sleep(self.proc_start_sleep)
+
+				return output
+
+			except Exception as err:
+				logging.error("Can't start engine {} => {}".format(self.name, err))
+
+	def stop(self):
+		if self.proc:
+			try:
+				logging.info("Stopping Engine " + self.name)
+				self.proc.terminate()
+				try:
+					self.proc.wait(self.proc_timeout)
+				except subprocess.TimeoutExpired:
+					self.proc.kill()
+				self.proc = None
+			except Exception as err:
+				logging.error("Can't stop engine {} => {}".format(self.name, err))
+
+	def proc_get_output(self):
+		if self.command_prompt:
+			prompt = self.command_prompt.encode()
+			fd = self.proc.stdout.fileno()
+			buf = bytearray()
+			while True:
+				data = os.read(fd, 4096)
+				if not data:
+					break
+				buf += data
+				if buf.endswith(prompt):
+					del buf[-len(prompt):]
+					break
+			return buf.decode(errors='replace')
+		else:
+			#logging.info("Command Prompt is not defined.")
+			return None
+
+	def proc_cmd(self, cmd):
+		if self.proc:
+			try:
+				#logging.debug("proc command: "+cmd)
+				self.proc.stdin.write((cmd + "\n").encode())
+				self.proc.stdin.flush()
+				out = self.proc_get_output()
+				#logging.debug("proc output:\n{}".format(out))
+			except Exception as err:
+				out = ""
+				logging.error("Can't exec engine command: {} => {}".format(cmd, err))
+			return out
+
+
 # ------------------------------------------------------------------------------
 # Synth Engine Base Class
 # ------------------------------------------------------------------------------
@@ -176,6 +321,8 @@ class zynthian_engine(zynthian_basic_engine):
 			'ctrl_fb': False
 		}
 
+		# Deferred import: liblo is only pulled in when an engine is created
+		import liblo
 		self.osc_proto = liblo.UDP
 		self.osc_target = None
 		self.osc_target_port = None
@@ -185,6 +332,8 @@ class zynthian_engine(zynthian_basic_engine):
 
 		self.preset_favs = None
 		self.preset_favs_fpath = None
+		self.preset_favs_timer = None
+		self._favs_by_bank = defaultdict(list)
 		self.show_favs_bank = True
 
 	def reset(self):
@@ -215,6 +364,7 @@ class zynthian_engine(zynthian_basic_engine):
 	# ---------------------------------------------------------------------------
 
 	def osc_init(self):
+		import liblo
 		if self.osc_server is None and self.osc_target_port:
 			try:
 				self.osc_target = liblo.Address('localhost', self.osc_target_port, self.osc_proto)
@@ -258,6 +408,10 @@ class zynthian_engine(zynthian_basic_engine):
 	def stop(self):
 		super().stop()
 		self.osc_end()
+		# Flush pending preset favorites before going away
+		if self.preset_favs_timer:
+			self.preset_favs_timer.cancel()
+			self.save_preset_favs()
 
 	# ---------------------------------------------------------------------------
 	# Auxiliary functions for bank & preset management
@@ -265,10 +419,7 @@ class zynthian_engine(zynthian_basic_engine):
 
 	@classmethod
 	def find_some_preset_file(cls, path, recursion=1):
-		rules = []
-		for ext in cls.preset_fexts:
-			rules.append(fnmatch.translate("*." + ext))
-		rerule = re.compile("(" + "|".join(rules) + ")", re.IGNORECASE)
+		rerule = _compile_preset_fexts_rule(tuple(cls.preset_fexts))
 		for item in glob.iglob(os.path.join(path, "**"), recursive=True):
 			if rerule.match(item):
 				return True
@@ -276,10 +427,7 @@ class zynthian_engine(zynthian_basic_engine):
 
 	@classmethod
 	def find_all_preset_files(cls, path, recursion=1):
-		rules = []
-		for ext in cls.preset_fexts:
-			rules.append(fnmatch.translate("*." + ext))
-		rerule = re.compile("(" + "|".join(rules) + ")", re.IGNORECASE)
+		rerule = _compile_preset_fexts_rule(tuple(cls.preset_fexts))
 		res = []
 		for item in glob.iglob(os.path.join(path, "**"), recursive=True):
 			if rerule.match(item):
@@ -291,6 +439,11 @@ class zynthian_engine(zynthian_basic_engine):
 		res = []
 		if isinstance(dpath, str):
 			dpath = [('_', dpath)]
+		cache_key = (tuple((dpd[0], dpd[1]) for dpd in dpath), fext)
+		mtimes = _get_dir_mtimes(dpath)
+		cached = _get_cached_listing(cache_key, mtimes)
+		if cached is not None:
+			return cached
 		fext = '.' + fext
 		xlen = len(fext)
 		i = 0
@@ -298,17 +451,21 @@ class zynthian_engine(zynthian_basic_engine):
 			dp = dpd[1]
 			dn = dpd[0]
 			try:
-				for f in sorted(os.listdir(dp)):
-					if not f.startswith('.') and isfile(join(dp, f)) and f[-xlen:].lower() == fext:
-						title = str.replace(f[:-xlen], '_', ' ')
-						if dn != '_': title = dn + '/' + title
+				with os.scandir(dp) as it:
+					entries = sorted(it, key=lambda e: e.name)
+				for entry in entries:
+					f = entry.name
+					if not f.startswith('.') and entry.is_file() and f[-xlen:].lower() == fext:
+						title = f[:-xlen].translate(_UNDERSCORE_TO_SPACE)
+						if dn != '_': title = f'{dn}/{title}'
 						#print("filelist => " + title)
-						res.append([join(dp, f), i, title, dn, f])
+						res.append([entry.path, i, title, dn, f])
 						i = i + 1
 			except Exception as e:
 				#logging.warning("Can't access directory '{}' => {}".format(dp,e))
 				pass
 
+		_store_cached_listing(cache_key, mtimes, res)
 		return res
 
 	@staticmethod
@@ -316,25 +473,34 @@ class zynthian_engine(zynthian_basic_engine):
 		res = []
 		if isinstance(dpath, str):
 			dpath = [('_', dpath)]
+		cache_key = (tuple((dpd[0], dpd[1]) for dpd in dpath), exclude_empty)
+		mtimes = _get_dir_mtimes(dpath)
+		cached = _get_cached_listing(cache_key, mtimes)
+		if cached is not None:
+			return cached
 		i = 0
 		for dpd in dpath:
 			dp = dpd[1]
 			dn = dpd[0]
 			try:
-				for f in sorted(os.listdir(dp)):
-					dpath = join(dp,f)
-					if not os.path.isdir(dpath) or (exclude_empty and next(os.scandir(dpath), None) is None):
+				with os.scandir(dp) as it:
+					entries = sorted(it, key=lambda e: e.name)
+				for entry in entries:
+					f = entry.name
+					if f.startswith('.') or not entry.is_dir():
 						continue
-					if not f.startswith('.') and isdir(dpath):
-						title, ext = os.path.splitext(f)
-						title = str.replace(title, '_', ' ')
-						if dn != '_': title = dn + '/' + title
-						res.append([dpath, i, title, dn, f])
-						i = i + 1
+					if exclude_empty and next(os.scandir(entry.path), None) is None:
+						continue
+					title, ext = os.path.splitext(f)
+					title = title.translate(_UNDERSCORE_TO_SPACE)
+					if dn != '_': title = f'{dn}/{title}'
+					res.append([entry.path, i, title, dn, f])
+					i = i + 1
 			except Exception as e:
 				#logging.warning("Can't access directory '{}' => {}".format(dp,e))
 				pass
 
+		_store_cached_listing(cache_key, mtimes, res)
 		return res
 
 	# Get bank dir list
@@ -427,12 +593,12 @@ class zynthian_engine(zynthian_basic_engine):
 		pass
 
 	def get_active_midi_channels(self):
-		chans = []
+		chans = set()
 		for processor in self.processors:
 			if processor.midi_chan is None:
 				return None
 			elif 0 <= processor.midi_chan <= 15:
-				chans.append(processor.midi_chan)
+				chans.add(processor.midi_chan)
 		return chans
 
 	# ---------------------------------------------------------------------------
@@ -462,11 +628,8 @@ class zynthian_engine(zynthian_basic_engine):
 
 	def cmp_presets(self, preset1, preset2):
 		try:
-			if preset1[1][0] == preset2[1][0] and preset1[1][1] == preset2[1][1] and preset1[1][2] == preset2[1][2]:
-				return True
-			else:
-				return False
-		except:
+			return preset1[1][:3] == preset2[1][:3]
+		except (TypeError, IndexError):
 			return False
 
 	def is_preset_user(self, preset):
@@ -489,36 +652,68 @@ class zynthian_engine(zynthian_basic_engine):
 			self.load_preset_favs()
 
 		try:
-			del self.preset_favs[str(preset[0])]
+			bank_info, fav_preset = self.preset_favs.pop(str(preset[0]))
+			self._unindex_preset_fav(bank_info, fav_preset)
 			fav_status = False
-		except:
+		except KeyError:
 			self.preset_favs[str(preset[0])] = [processor.bank_info, preset]
+			self._favs_by_bank[str(processor.bank_info[0])].append(preset)
 			fav_status = True
 
-		try:
-			with open(self.preset_favs_fpath, 'w') as f:
-				json.dump(self.preset_favs, f)
-		except Exception as e:
-			logging.error("Can't save preset favorites! => {}".format(e))
-
+		self.schedule_save_preset_favs()
 		return fav_status
 
 	def remove_preset_fav(self, preset):
 		if self.preset_favs is None:
 			self.load_preset_favs()
 		try:
-			del self.preset_favs[str(preset[0])]
-			with open(self.preset_favs_fpath, 'w') as f:
-				json.dump(self.preset_favs, f)
-		except:
+			bank_info, fav_preset = self.preset_favs.pop(str(preset[0]))
+			self._unindex_preset_fav(bank_info, fav_preset)
+			self.schedule_save_preset_favs()
+		except KeyError:
 			pass # Don't care if preset not in favs
 
+	def _unindex_preset_fav(self, bank_info, preset):
+		try:
+			self._favs_by_bank[str(bank_info[0])].remove(preset)
+		except (KeyError, ValueError):
+			pass
+
+	# Debounce disk writes so quick fav toggling doesn't block the UI thread
+	def schedule_save_preset_favs(self):
+		if self.preset_favs_timer:
+			self.preset_favs_timer.cancel()
+		self.preset_favs_timer = Timer(0.5, self.save_preset_favs)
+		self.preset_favs_timer.daemon = True
+		self.preset_favs_timer.start()
+
+	def save_preset_favs(self):
+		self.preset_favs_timer = None
+		try:
+			# Write atomically: dump to a temp file, then replace
+			tmp_fpath = self.preset_favs_fpath + ".tmp"
+			if orjson:
+				with open(tmp_fpath, 'wb') as f:
+					f.write(orjson.dumps(self.preset_favs))
+			else:
+				with open(tmp_fpath, 'w') as f:
+					json.dump(self.preset_favs, f)
+			os.replace(tmp_fpath, self.preset_favs_fpath)
+		except Exception as e:
+			logging.error("Can't save preset favorites! => {}".format(e))
+
 	def get_preset_favs(self, processor):
 		if self.preset_favs is None:
 			self.load_preset_favs()
 
 		return self.preset_favs
 
+	def get_preset_favs_for_bank(self, bank_info):
+		if self.preset_favs is None:
+			self.load_preset_favs()
+
+		return self._favs_by_bank.get(str(bank_info[0]), [])
+
 	def is_preset_fav(self, preset):
 		if self.preset_favs is None:
 			self.load_preset_favs()
@@ -535,11 +730,20 @@ class zynthian_engine(zynthian_basic_engine):
 			self.preset_favs_fpath = self.my_data_dir + "/preset-favorites/" + fname + ".json"
 
 			try:
-				with open(self.preset_favs_fpath) as f:
-					self.preset_favs = json.load(f)
+				if orjson:
+					with open(self.preset_favs_fpath, 'rb') as f:
+						self.preset_favs = orjson.loads(f.read())
+				else:
+					with open(self.preset_favs_fpath) as f:
+						self.preset_favs = json.load(f)
 			except:
 				self.preset_favs = {}
 
+			# Secondary index by bank, so per-bank lookups don't rescan all favs
+			self._favs_by_bank = defaultdict(list)
+			for bank_info, preset in self.preset_favs.values():
+				self._favs_by_bank[str(bank_info[0])].append(preset)
+
 			#TODO: Remove invalid presets from favourite's list
 
 		else:
@@ -549,6 +753,41 @@ class zynthian_engine(zynthian_basic_engine):
 	# Controllers Management
 	# ---------------------------------------------------------------------------
 
+	# Pre-resolve the static structure branching of the _ctrls entries.
+	# + Each entry is interpreted (dict options vs OSC path vs MIDI CC, optional
+	#   value/value_max/graph_path params) once instead of on every rebuild.
+	# + The plan is recomputed when the _ctrls list is rebound or changes length,
+	#   which covers every way the engines redefine their controllers.
+	def _get_ctrl_plan(self):
+		fingerprint = (id(self._ctrls), len(self._ctrls))
+		if getattr(self, '_ctrl_plan_fingerprint', None) != fingerprint:
+			plan = []
+			for ctrl in self._ctrls:
+				symbol = ctrl[0]
+				if isinstance(ctrl[1], dict):
+					plan.append((symbol, 'options', ctrl[1], None, None))
+					continue
+				# Options applied when reconfiguring an existing controller ...
+				reconf_opts = {}
+				if len(ctrl) > 2:
+					# param 2 is zctrl value
+					reconf_opts['value'] = ctrl[2]
+				if len(ctrl) > 3:
+					# optional param 3 is called value_max but actually could be a configuration object
+					reconf_opts['value_max'] = ctrl[3]
+				# ... and when building a new one (includes the graph path)
+				create_opts = dict(reconf_opts)
+				if len(ctrl) > 4:
+					# optional param 4 is graph path
+					create_opts['graph_path'] = ctrl[4]
+				if isinstance(ctrl[1], str):
+					plan.append((symbol, 'osc', _compile_osc_template(ctrl[1]), reconf_opts, create_opts))
+				else:
+					plan.append((symbol, 'midi', ctrl[1], reconf_opts, create_opts))
+			self._ctrl_plan = plan
+			self._ctrl_plan_fingerprint = fingerprint
+		return self._ctrl_plan
+
 	# Get zynthian controllers dictionary.
 	# Updates existing processor dictionary.
 	# + Default implementation uses a static controller definition array
@@ -557,74 +796,56 @@ class zynthian_engine(zynthian_basic_engine):
 
 		if self._ctrls is not None:
 			# Remove controls that are no longer used
+			ctrl_symbols = {ctrl[0] for ctrl in self._ctrls}
 			for symbol in list(processor.controllers_dict):
-				d = True
-				for i in self._ctrls:
-					if symbol == i[0]:
-						d = False
-						break
-				if d:
+				if symbol not in ctrl_symbols:
 					del processor.controllers_dict[symbol]
 				else:
 					processor.controllers_dict[symbol].reset(self, symbol)
 
-			for ctrl in self._ctrls:
+			for symbol, kind, spec, reconf_opts, create_opts in self._get_ctrl_plan():
 				cc = None
 				options = {}
 				build_from_options = False
-				if isinstance(ctrl[1], dict):
-					options = ctrl[1]
+				if kind == 'options':
+					options = spec
 					build_from_options = True
 				# OSC control =>
-				elif isinstance(ctrl[1], str):
+				elif kind == 'osc':
 					#replace variables ...
-					tpl = Template(ctrl[1])
-					cc = tpl.safe_substitute(ch=midich)
-					try:
-						cc = tpl.safe_substitute(i=processor.part_i)
-					except:
-						pass
+					subs = {'ch': midich}
+					part_i = getattr(processor, 'part_i', None)
+					if part_i is not None:
+						subs['i'] = part_i
+					cc = spec.safe_substitute(**subs)
 					#set osc_port option ...
 					if self.osc_target_port > 0:
 						options['osc_port'] = self.osc_target_port
 					#debug message
-					logging.debug('CONTROLLER %s OSC PATH => %s' % (ctrl[0], cc))
+					logging.debug('CONTROLLER %s OSC PATH => %s' % (symbol, cc))
 				# MIDI Control =>
 				else:
-					cc = ctrl[1]
+					cc = spec
 
 				options["processor"] = processor
 				options["midi_chan"] = midich
 				if cc is not None:
 					options["midi_cc"] = cc
 
-				# Build controller depending on array length ...
-				if ctrl[0] in processor.controllers_dict:
+				if symbol in processor.controllers_dict:
 					# Controller already exists so reconfigure with new settings
 					if build_from_options:
-						processor.controllers_dict[ctrl[0]].set_options(options)
-					elif len(ctrl) > 3:
-						options['value'] = ctrl[2]
-						options['value_max'] = ctrl[3]
-						processor.controllers_dict[ctrl[0]].set_options(options)
-					elif len(ctrl) > 2:
-						options['value'] = ctrl[2]
-						processor.controllers_dict[ctrl[0]].set_options(options)
+						processor.controllers_dict[symbol].set_options(options)
+					elif reconf_opts:
+						options.update(reconf_opts)
+						processor.controllers_dict[symbol].set_options(options)
 					continue
 
 				else:
 					if not build_from_options:
-						if len(ctrl) > 4:
-							# optional param 4 is graph path
-							options['graph_path'] = ctrl[4]
-						if len(ctrl) > 3:
-							# optional param 3 is called value_max but actually could be a configuration object 
-							options['value_max'] = ctrl[3]
-						if len(ctrl) > 2:
-							# param 2 is zctrl value
-							options['value'] = ctrl[2]
-					# param 0 is symbol string, param 1 is options or midi cc or osc path
-					zctrl = zynthian_controller(self, ctrl[0], options)
+						options.update(create_opts)
+					# symbol string + options or midi cc or osc path
+					zctrl = zynthian_controller(self, symbol, options)
 
 				if zctrl.midi_cc is not None:
 					self.state_manager.chain_manager.add_midi_learn(zctrl.midi_chan, zctrl.midi_cc, zctrl)
@@ -643,42 +864,27 @@ class zynthian_engine(zynthian_basic_engine):
 			self._ctrl_screens = []
 
 		# Get zctrls by group
-		zctrl_group = {}
+		zctrl_group = defaultdict(lambda: [None, {}])
 		for symbol, zctrl in zctrl_dict.items():
-			gsymbol = zctrl.group_symbol
-			if gsymbol not in zctrl_group:
-				if zctrl.group_name:
-					zctrl_group[gsymbol] = [zctrl.group_name, {}]
-				else:
-					zctrl_group[gsymbol] = [zctrl.group_symbol, {}]
-			zctrl_group[gsymbol][1][symbol] = zctrl
+			gdata = zctrl_group[zctrl.group_symbol]
+			if gdata[0] is None:
+				gdata[0] = zctrl.group_name or zctrl.group_symbol
+			gdata[1][symbol] = zctrl
 		if None in zctrl_group:
 			zctrl_group[None][0] = "Ctrls"
 
 		for gsymbol, gdata in zctrl_group.items():
-			ctrl_set = []
 			gname = gdata[0]
 			if len(gdata[1]) <= 4:
 				c = 0
 			else:
 				c = 1
-			for symbol, zctrl in gdata[1].items():
-				try:
-					if not self.ignore_not_on_gui and zctrl.not_on_gui:
-						continue
-					#logging.debug("CTRL {}".format(symbol))
-					ctrl_set.append(symbol)
-					if len(ctrl_set) >= 4:
-						#logging.debug("ADDING CONTROLLER SCREEN {}".format(self.get_ctrl_screen_name(gname,c)))
-						self._ctrl_screens.append([self.get_ctrl_screen_name(gname,c),ctrl_set])
-						ctrl_set = []
-						c = c + 1
-				except Exception as err:
-					logging.error("Generating Controller Screens => {}".format(err))
-
-			if len(ctrl_set) >= 1:
-				#logging.debug("ADDING CONTROLLER SCREEN {}",format(self.get_ctrl_screen_name(gname,c)))
-				self._ctrl_screens.append([self.get_ctrl_screen_name(gname,c),ctrl_set])
+			symbols = [symbol for symbol, zctrl in gdata[1].items()
+				if self.ignore_not_on_gui or not zctrl.not_on_gui]
+			# Chunk in screens of 4 controllers
+			for pos in range(0, len(symbols), 4):
+				self._ctrl_screens.append([self.get_ctrl_screen_name(gname, c), symbols[pos:pos + 4]])
+				c = c + 1
 
 	def send_controller_value(self, zctrl):
 		raise Exception("NOT IMPLEMENTED!")
@@ -30,6 +30,7 @@ import traceback
 from glob import glob
 from threading import Thread
 from queue import SimpleQueue
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from time import sleep, monotonic
 from json import JSONEncoder, JSONDecoder
@@ -2467,17 +2468,23 @@ class zynthian_state_manager:
         if self.checking_for_updates:
             return
         self.checking_for_updates = True
+        def check_repo(path):
+            try:
+                # A single rev-parse call returns local hash & branch name
+                local_hash, branch = check_output(["git", "-C", path, "rev-parse", "HEAD", "--abbrev-ref", "HEAD"], encoding="utf-8", stderr=STDOUT).split()
+                remote_hash = check_output(["git", "-C", path, "ls-remote", "origin", branch], encoding="utf-8", stderr=STDOUT).strip().split('\t')[0]
+                return local_hash != remote_hash
+            except:
+                return False
+
         def update_thread():
-            update_available = False
+            repos = ["/zynthian/zyncoder", "/zynthian/zynthian-ui", "/zynthian/zynthian-sys", "/zynthian/zynthian-webconf", "/zynthian/zynthian-data"]
             try:
-                repos = ["/zynthian/zyncoder", "/zynthian/zynthian-ui", "/zynthian/zynthian-sys", "/zynthian/zynthian-webconf", "/zynthian/zynthian-data"]
-                for path in repos:
-                    branch = check_output(["git", "-C", path, "rev-parse", "--abbrev-ref", "HEAD"], encoding="utf-8", stderr=STDOUT).strip()
-                    local_hash = check_output(["git", "-C", path, "rev-parse", "HEAD"], encoding="utf-8", stderr=STDOUT).strip()
-                    remote_hash = check_output(["git", "-C", path, "ls-remote", "origin", branch], encoding="utf-8", stderr=STDOUT).strip().split('\t')[0]
-                    update_available |= local_hash != remote_hash
+                # The remote queries are network-bound, so run them concurrently
+                with ThreadPoolExecutor(max_workers=len(repos)) as executor:
+                    update_available = any(executor.map(check_repo, repos))
             except:
-                pass
+                update_available = False
             self.update_available = update_available
             self.checking_for_updates = False
 
@@ -609,6 +609,8 @@ class zynthian_gui:
 			self.screens[screen].show()
 			self.current_screen = screen
 			self.hide_screens(exclude=screen)
+			if self.wsleds:
+				self.wsleds.invalidate()
 			zynsigman.send(zynsigman.S_GUI, self.SS_SHOW_SCREEN, screen=screen)
 
 		self.screen_lock.release()
@@ -1060,6 +1062,8 @@ class zynthian_gui:
 			self.alt_mode = False
 		else:
 			self.alt_mode = True
+		if self.wsleds:
+			self.wsleds.invalidate()
 
 	def cuia_power_off(self, params=None):
 		if params == ['CONFIRM']:
@@ -24,12 +24,12 @@
 # ******************************************************************************
 
 import os
-import re
 import signal
 import logging
-from time import sleep
+from time import sleep, monotonic
 from threading import Thread
 from curses import A_HORIZONTAL
+from concurrent.futures import ThreadPoolExecutor
 from subprocess import check_output, Popen, PIPE, STDOUT
 
 # Zynthian specific modules
@@ -43,15 +43,44 @@ from zyngui.zynthian_gui_selector import zynthian_gui_selector
 # Zynthian Admin GUI Class
 # -------------------------------------------------------------------------------
 
+# Composed checkbox labels, built once and reused across fill_list calls
+_toggle_labels = {}
+
+# Short-lived cache for service status checks, so rebuilding the list after
+# each toggle doesn't shell-out to systemctl again and again
+_svc_cache = {}
+
+
+def _svc_active(service, ttl=2.0):
+	try:
+		ts, val = _svc_cache[service]
+		if monotonic() - ts < ttl:
+			return val
+	except KeyError:
+		pass
+	val = zynconf.is_service_active(service)
+	_svc_cache[service] = (monotonic(), val)
+	return val
+
+
 
 class zynthian_gui_admin(zynthian_gui_selector):
 
 	data_dir = os.environ.get('ZYNTHIAN_DATA_DIR', "/zynthian/zynthian-data")
 	sys_dir = os.environ.get('ZYNTHIAN_SYS_DIR', "/zynthian/zynthian-sys")
 
+	# Full paths used by the test/update actions, built once
+	update_sw_script = sys_dir + "/scripts/update_zynthian.sh"
+	update_sys_script = sys_dir + "/scripts/update_system.sh"
+	test_audio_file = data_dir + "/audio/test.mp3"
+	test_midi_file = data_dir + "/mid/test.mid"
+
+	# Single worker preserves the "one command sequence at a time" invariant
+	_cmd_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="admin_cmd")
+
 	def __init__(self):
 		self.commands = None
-		self.thread = None
+		self.cmd_future = None
 		self.child_pid = None
 
 		self.last_action = None
@@ -101,47 +130,41 @@ class zynthian_gui_admin(zynthian_gui_selector):
 		self.refresh_wifi_thread = None
 		super().hide()
 
+	def append_toggle(self, cb, state, label):
+		key = (label, bool(state))
+		try:
+			text = _toggle_labels[key]
+		except KeyError:
+			text = ("\u2612 " if state else "\u2610 ") + label
+			_toggle_labels[key] = text
+		self.list_data.append((cb, 0, text))
+
 	def fill_list(self):
 		if self.filling_list:
 			return
 
 		self.filling_list = True
 		self.list_data = []
+		zgc = zynthian_gui_config
 
 		self.list_data.append((None, 0, "> MIDI"))
 		self.list_data.append((self.zyngui.midi_in_config, 0, "MIDI Input Devices"))
 		self.list_data.append((self.zyngui.midi_out_config, 0, "MIDI Output Devices"))
 		#self.list_data.append((self.midi_profile, 0, "MIDI Profile"))
 
-		if lib_zyncore.get_active_midi_chan():
-			self.list_data.append((self.toggle_active_midi_channel, 0, "\u2612 Active MIDI channel"))
-		else:
-			self.list_data.append((self.toggle_active_midi_channel, 0, "\u2610 Active MIDI channel"))
+		self.append_toggle(self.toggle_active_midi_channel, lib_zyncore.get_active_midi_chan(), "Active MIDI channel")
 
-		if zynthian_gui_config.midi_prog_change_zs3:
-			self.list_data.append((self.toggle_prog_change_zs3, 0, "\u2612 Program Change for ZS3"))
+		if zgc.midi_prog_change_zs3:
+			self.append_toggle(self.toggle_prog_change_zs3, True, "Program Change for ZS3")
 		else:
-			self.list_data.append((self.toggle_prog_change_zs3, 0, "\u2610 Program Change for ZS3"))
-			if zynthian_gui_config.midi_bank_change:
-				self.list_data.append((self.toggle_bank_change, 0, "\u2612 MIDI Bank Change"))
-			else:
-				self.list_data.append((self.toggle_bank_change, 0, "\u2610 MIDI Bank Change"))
+			self.append_toggle(self.toggle_prog_change_zs3, False, "Program Change for ZS3")
+			self.append_toggle(self.toggle_bank_change, zgc.midi_bank_change, "MIDI Bank Change")
 
-		if zynthian_gui_config.preset_preload_noteon:
-			self.list_data.append((self.toggle_preset_preload_noteon, 0, "\u2612 Note-On Preset Preload"))
-		else:
-			self.list_data.append((self.toggle_preset_preload_noteon, 0, "\u2610 Note-On Preset Preload"))
-
-		if zynthian_gui_config.midi_usb_by_port:
-			self.list_data.append((self.toggle_usbmidi_by_port, 0, "\u2612 MIDI-USB mapped by port"))
-		else:
-			self.list_data.append((self.toggle_usbmidi_by_port, 0, "\u2610 MIDI-USB mapped by port"))
+		self.append_toggle(self.toggle_preset_preload_noteon, zgc.preset_preload_noteon, "Note-On Preset Preload")
+		self.append_toggle(self.toggle_usbmidi_by_port, zgc.midi_usb_by_port, "MIDI-USB mapped by port")
 
-		if zynthian_gui_config.transport_clock_source == 0:
-			if zynthian_gui_config.midi_sys_enabled:
-				self.list_data.append((self.toggle_midi_sys, 0, "\u2612 MIDI System Messages"))
-			else:
-				self.list_data.append((self.toggle_midi_sys, 0, "\u2610 MIDI System Messages"))
+		if zgc.transport_clock_source == 0:
+			self.append_toggle(self.toggle_midi_sys, zgc.midi_sys_enabled, "MIDI System Messages")
 
 		gtrans = lib_zyncore.get_global_transpose()
 		if gtrans > 0:
@@ -153,29 +176,22 @@ class zynthian_gui_admin(zynthian_gui_selector):
 		self.list_data.append((None, 0, "> AUDIO"))
 
 		if self.state_manager.allow_rbpi_headphones():
-			if zynthian_gui_config.rbpi_headphones:
-				self.list_data.append((self.stop_rbpi_headphones, 0, "\u2612 RBPi Headphones"))
+			if zgc.rbpi_headphones:
+				self.append_toggle(self.stop_rbpi_headphones, True, "RBPi Headphones")
 			else:
-				self.list_data.append((self.start_rbpi_headphones, 0, "\u2610 RBPi Headphones"))
+				self.append_toggle(self.start_rbpi_headphones, False, "RBPi Headphones")
 
-		if zynthian_gui_config.snapshot_mixer_settings:
-			self.list_data.append((self.toggle_snapshot_mixer_settings, 0, "\u2612 Audio Levels on Snapshots"))
-		else:
-			self.list_data.append((self.toggle_snapshot_mixer_settings, 0, "\u2610 Audio Levels on Snapshots"))
-
-		if zynthian_gui_config.enable_dpm:
-			self.list_data.append((self.toggle_dpm, 0, "\u2612 Mixer Peak Meters"))
-		else:
-			self.list_data.append((self.toggle_dpm, 0, "\u2610 Mixer Peak Meters"))
+		self.append_toggle(self.toggle_snapshot_mixer_settings, zgc.snapshot_mixer_settings, "Audio Levels on Snapshots")
+		self.append_toggle(self.toggle_dpm, zgc.enable_dpm, "Mixer Peak Meters")
 
 		self.list_data.append((None, 0, "> NETWORK"))
 		self.list_data.append((self.network_info, 0, "Network Info"))
 		self.list_data.append((self.wifi_config, 0, f"Wi-Fi Config ({self.wifi_status})"))
 		self.wifi_index = len(self.list_data) - 1
-		if zynconf.is_service_active("vncserver0"):
-			self.list_data.append((self.state_manager.stop_vncserver, 0, "\u2612 VNC Server"))
+		if _svc_active("vncserver0"):
+			self.append_toggle(self.stop_vncserver, True, "VNC Server")
 		else:
-			self.list_data.append((self.state_manager.start_vncserver, 0, "\u2610 VNC Server"))
+			self.append_toggle(self.start_vncserver, False, "VNC Server")
 
 		self.list_data.append((None, 0, "> SETTINGS"))
 		self.list_data.append((self.bluetooth, 0, "Bluetooth"))
@@ -188,20 +204,20 @@ class zynthian_gui_admin(zynthian_gui_selector):
 		self.list_data.append((None, 0, "> TEST"))
 		self.list_data.append((self.test_audio, 0, "Test Audio"))
 		self.list_data.append((self.test_midi, 0, "Test MIDI"))
-		if zynthian_gui_config.control_test_enabled:
+		if zgc.control_test_enabled:
 			self.list_data.append((self.control_test, 0, "Test control HW"))
 
 		self.list_data.append((None, 0, "> SYSTEM"))
 		if self.zyngui.capture_log_fname:
-			self.list_data.append((self.workflow_capture_stop, 0, "\u2612 Capture Workflow"))
+			self.append_toggle(self.workflow_capture_stop, True, "Capture Workflow")
 		else:
-			self.list_data.append((self.workflow_capture_start, 0, "\u2610 Capture Workflow"))
+			self.append_toggle(self.workflow_capture_start, False, "Capture Workflow")
 		if self.state_manager.update_available:
 			self.list_data.append((self.update_software, 0, "Update Software"))
 		#self.list_data.append((self.update_system, 0, "Update Operating System"))
 		#self.list_data.append((None, 0, "> POWER"))
 		#self.list_data.append((self.restart_gui, 0, "Restart UI"))
-		if zynthian_gui_config.debug_thread:
+		if zgc.debug_thread:
 			self.list_data.append((self.exit_to_console, 0, "Exit"))
 		self.list_data.append((self.reboot, 0, "Reboot"))
 		self.list_data.append((self.power_off, 0, "Power Off"))
@@ -209,6 +225,31 @@ class zynthian_gui_admin(zynthian_gui_selector):
 		super().fill_list()
 		self.filling_list = False
 
+	# Rewrite just the toggled row in place: a full fill_list rebuild (with its
+	# service checks) isn't needed when only one checkbox glyph changes
+	def refresh_toggle_row(self, cb, state):
+		try:
+			i = self.last_selected_index
+			# Compare with ==: each attribute access materializes a new bound
+			# method object, so identity never matches the one stored in fill_list
+			if self.list_data[i][0] != cb:
+				i = next(j for j, row in enumerate(self.list_data) if row[0] == cb)
+		except (TypeError, IndexError, StopIteration):
+			self.update_list()
+			return
+		label = self.list_data[i][2][2:]
+		key = (label, bool(state))
+		try:
+			text = _toggle_labels[key]
+		except KeyError:
+			text = ("\u2612 " if state else "\u2610 ") + label
+			_toggle_labels[key] = text
+		self.list_data[i] = (cb, self.list_data[i][1], text)
+		if self.shown:
+			self.listbox.delete(i)
+			self.listbox.insert(i, text)
+			self.select(i)
+
 	def select_action(self, i, t='S'):
 		self.last_selected_index = i
 		if self.list_data[i][0]:
@@ -223,20 +264,25 @@ class zynthian_gui_admin(zynthian_gui_selector):
 		self.state_manager.start_busy("admin_commands")
 		error_counter = 0
 		for cmd in self.commands:
-			logging.info("Executing Command: %s" % cmd)
+			cmd_str = cmd if isinstance(cmd, str) else " ".join(cmd)
+			logging.info("Executing Command: %s" % cmd_str)
 			self.zyngui.add_info("EXECUTING:\n", "EMPHASIS")
-			self.zyngui.add_info("{}\n".format(cmd))
+			self.zyngui.add_info("{}\n".format(cmd_str))
 			try:
-				self.proc = Popen(cmd, shell=True, stdout=PIPE, stderr=STDOUT, universal_newlines=True)
+				# Commands given as argv lists run without the intermediate shell
+				self.proc = Popen(cmd, shell=isinstance(cmd, str), stdout=PIPE, stderr=STDOUT)
 				self.zyngui.add_info("RESULT:\n", "EMPHASIS")
-				for line in self.proc.stdout:
-					if re.search("ERROR", line, re.IGNORECASE):
+				# Read binary & classify on bytes: skips text-mode decoding per line
+				for line in iter(self.proc.stdout.readline, b""):
+					low = line.lower()
+					if b"error" in low:
 						error_counter += 1
 						tag = "ERROR"
-					elif re.search("Already", line, re.IGNORECASE):
+					elif b"already" in low:
 						tag = "SUCCESS"
 					else:
 						tag = None
+					line = line.decode("utf-8", "replace")
 					logging.info(line.rstrip())
 					self.zyngui.add_info(line, tag)
 				self.zyngui.add_info("\n")
@@ -260,10 +306,7 @@ class zynthian_gui_admin(zynthian_gui_selector):
 		if not self.commands:
 			logging.info("Starting Command Sequence")
 			self.commands = cmds
-			self.thread = Thread(target=self.execute_commands, args=())
-			self.thread.name = "command sequence"
-			self.thread.daemon = True  # thread dies with the program
-			self.thread.start()
+			self.cmd_future = self._cmd_executor.submit(self.execute_commands)
 
 	def killable_execute_commands(self):
 		#self.state_manager.start_busy("admin commands")
@@ -297,12 +340,11 @@ class zynthian_gui_admin(zynthian_gui_selector):
 		if not self.commands:
 			logging.info("Starting Command Sequence")
 			self.commands = cmds
-			self.thread = Thread(target=self.killable_execute_commands, args=())
-			self.thread.name = "killable command sequence"
-			self.thread.daemon = True  # thread dies with the program
-			self.thread.start()
+			self.cmd_future = self._cmd_executor.submit(self.killable_execute_commands)
 
 	def kill_command(self):
+		if self.cmd_future:
+			self.cmd_future.cancel()
 		if self.child_pid:
 			logging.info("Killing process %s" % self.child_pid)
 			os.kill(self.child_pid, signal.SIGTERM)
@@ -314,14 +356,23 @@ class zynthian_gui_admin(zynthian_gui_selector):
 	# CONFIG OPTIONS
 	# ------------------------------------------------------------------------------
 
+	# Persist config off the UI thread: the toggle only mutates in-memory state,
+	# so the list can be refreshed right away without waiting for the SD card
+	def _persist_config_async(self, payload, midi=False):
+		if midi:
+			self._cmd_executor.submit(zynconf.update_midi_profile, payload)
+		else:
+			self._cmd_executor.submit(zynconf.save_config, payload)
+
 	def start_rbpi_headphones(self, save_config=True):
 		logging.info("STARTING RBPI HEADPHONES")
 		try:
-			check_output("systemctl start headphones", shell=True)
+			check_output(["systemctl", "start", "headphones"])
+			_svc_cache.pop("headphones", None)
 			zynthian_gui_config.rbpi_headphones = 1
 			# Update Config
 			if save_config:
-				zynconf.save_config({ 
+				self._persist_config_async({
 					"ZYNTHIAN_RBPI_HEADPHONES": str(zynthian_gui_config.rbpi_headphones)
 				})
 			# Call autoconnect after a little time
@@ -336,11 +387,12 @@ class zynthian_gui_admin(zynthian_gui_selector):
 		logging.info("STOPPING RBPI HEADPHONES")
 
 		try:
-			check_output("systemctl stop headphones", shell=True)
+			check_output(["systemctl", "stop", "headphones"])
+			_svc_cache.pop("headphones", None)
 			zynthian_gui_config.rbpi_headphones = 0
 			# Update Config
 			if save_config:
-				zynconf.save_config({ 
+				self._persist_config_async({
 					"ZYNTHIAN_RBPI_HEADPHONES": str(int(zynthian_gui_config.rbpi_headphones))
 				})
 
@@ -349,6 +401,16 @@ class zynthian_gui_admin(zynthian_gui_selector):
 
 		self.update_list()
 
+	def start_vncserver(self):
+		_svc_cache.pop("vncserver0", None)
+		self.state_manager.start_vncserver()
+		self.update_list()
+
+	def stop_vncserver(self):
+		_svc_cache.pop("vncserver0", None)
+		self.state_manager.stop_vncserver()
+		self.update_list()
+
 	# Start/Stop RBPI Headphones depending on configuration
 	def default_rbpi_headphones(self):
 		if zynthian_gui_config.rbpi_headphones:
@@ -358,7 +420,7 @@ class zynthian_gui_admin(zynthian_gui_selector):
 
 	def toggle_dpm(self):
 		zynthian_gui_config.enable_dpm = not zynthian_gui_config.enable_dpm
-		self.update_list()
+		self.refresh_toggle_row(self.toggle_dpm, zynthian_gui_config.enable_dpm)
 
 	def toggle_snapshot_mixer_settings(self):
 		if zynthian_gui_config.snapshot_mixer_settings:
@@ -369,10 +431,10 @@ class zynthian_gui_admin(zynthian_gui_selector):
 			zynthian_gui_config.snapshot_mixer_settings = True
 
 		# Update Config
-		zynconf.save_config({ 
+		self._persist_config_async({
 			"ZYNTHIAN_UI_SNAPSHOT_MIXER_SETTINGS": str(int(zynthian_gui_config.snapshot_mixer_settings))
 		})
-		self.update_list()
+		self.refresh_toggle_row(self.toggle_snapshot_mixer_settings, zynthian_gui_config.snapshot_mixer_settings)
 
 	def toggle_midi_sys(self):
 		if zynthian_gui_config.midi_sys_enabled:
@@ -383,12 +445,12 @@ class zynthian_gui_admin(zynthian_gui_selector):
 			zynthian_gui_config.midi_sys_enabled = True
 
 		# Update MIDI profile
-		zynconf.update_midi_profile({ 
+		self._persist_config_async({
 			"ZYNTHIAN_MIDI_SYS_ENABLED": str(int(zynthian_gui_config.midi_sys_enabled))
-		})
+		}, midi=True)
 
 		lib_zyncore.set_midi_system_events(zynthian_gui_config.midi_sys_enabled)
-		self.update_list()
+		self.refresh_toggle_row(self.toggle_midi_sys, zynthian_gui_config.midi_sys_enabled)
 
 	def bluetooth(self):
 			self.zyngui.show_screen("bluetooth")
@@ -422,10 +484,10 @@ class zynthian_gui_admin(zynthian_gui_selector):
 		lib_zyncore.set_active_midi_chan(zynthian_gui_config.active_midi_channel)
 
 		# Save config
-		zynconf.update_midi_profile({
+		self._persist_config_async({
 			"ZYNTHIAN_MIDI_ACTIVE_CHANNEL": str(int(zynthian_gui_config.active_midi_channel))
-		})
-		self.update_list()
+		}, midi=True)
+		self.refresh_toggle_row(self.toggle_active_midi_channel, zynthian_gui_config.active_midi_channel)
 
 	def toggle_usbmidi_by_port(self):
 		if zynthian_gui_config.midi_usb_by_port:
@@ -438,10 +500,10 @@ class zynthian_gui_admin(zynthian_gui_selector):
 		zynautoconnect.update_hw_midi_ports(True)
 
 		# Save config
-		zynconf.update_midi_profile({
+		self._persist_config_async({
 			"ZYNTHIAN_MIDI_USB_BY_PORT": str(int(zynthian_gui_config.midi_usb_by_port))
-		})
-		self.update_list()
+		}, midi=True)
+		self.refresh_toggle_row(self.toggle_usbmidi_by_port, zynthian_gui_config.midi_usb_by_port)
 
 	def toggle_prog_change_zs3(self):
 		if zynthian_gui_config.midi_prog_change_zs3:
@@ -452,9 +514,9 @@ class zynthian_gui_admin(zynthian_gui_selector):
 			zynthian_gui_config.midi_prog_change_zs3 = True
 
 		# Save config
-		zynconf.update_midi_profile({ 
+		self._persist_config_async({
 			"ZYNTHIAN_MIDI_PROG_CHANGE_ZS3": str(int(zynthian_gui_config.midi_prog_change_zs3))
-		})
+		}, midi=True)
 		self.update_list()
 
 	def toggle_bank_change(self):
@@ -466,10 +528,10 @@ class zynthian_gui_admin(zynthian_gui_selector):
 			zynthian_gui_config.midi_bank_change = True
 
 		# Save config
-		zynconf.update_midi_profile({ 
+		self._persist_config_async({
 			"ZYNTHIAN_MIDI_BANK_CHANGE": str(int(zynthian_gui_config.midi_bank_change))
-		})
-		self.update_list()
+		}, midi=True)
+		self.refresh_toggle_row(self.toggle_bank_change, zynthian_gui_config.midi_bank_change)
 
 	def toggle_preset_preload_noteon(self):
 		if zynthian_gui_config.preset_preload_noteon:
@@ -480,10 +542,10 @@ class zynthian_gui_admin(zynthian_gui_selector):
 			zynthian_gui_config.preset_preload_noteon = True
 
 		# Save config
-		zynconf.update_midi_profile({ 
+		self._persist_config_async({
 			"ZYNTHIAN_MIDI_PRESET_PRELOAD_NOTEON": str(int(zynthian_gui_config.preset_preload_noteon))
-		})
-		self.update_list()
+		}, midi=True)
+		self.refresh_toggle_row(self.toggle_preset_preload_noteon, zynthian_gui_config.preset_preload_noteon)
 
 	def show_cv_config(self):
 		self.zyngui.show_screen("cv_config")
@@ -517,12 +579,12 @@ class zynthian_gui_admin(zynthian_gui_selector):
 		logging.info("TESTING AUDIO")
 		self.zyngui.show_info("TEST AUDIO")
 		#self.killable_start_command(["mpg123 {}/audio/test.mp3".format(self.data_dir)])
-		self.killable_start_command(["mplayer -nogui -noconsolecontrols -nolirc -nojoystick -really-quiet -ao jack {}/audio/test.mp3".format(self.data_dir)])
+		self.killable_start_command(["mplayer -nogui -noconsolecontrols -nolirc -nojoystick -really-quiet -ao jack " + self.test_audio_file])
 		zynautoconnect.request_audio_connect()
 
 	def test_midi(self):
 		logging.info("TESTING MIDI")
-		self.zyngui.alt_mode = self.state_manager.toggle_midi_playback(f"{self.data_dir}/mid/test.mid")
+		self.zyngui.alt_mode = self.state_manager.toggle_midi_playback(self.test_midi_file)
 
 	def control_test(self, t='S'):
 		logging.info("TEST CONTROL HARDWARE")
@@ -547,7 +609,7 @@ class zynthian_gui_admin(zynthian_gui_selector):
 		logging.info("UPDATE SOFTWARE")
 		self.last_state_action()
 		self.zyngui.show_info("UPDATE SOFTWARE")
-		self.start_command([self.sys_dir + "/scripts/update_zynthian.sh"])
+		self.start_command([[self.update_sw_script]])
 		self.state_manager.update_available = False
 		self.update_available = False
 
@@ -555,7 +617,7 @@ class zynthian_gui_admin(zynthian_gui_selector):
 		logging.info("UPDATE SYSTEM")
 		self.last_state_action()
 		self.zyngui.show_info("UPDATE SYSTEM")
-		self.start_command([self.sys_dir + "/scripts/update_system.sh"])
+		self.start_command([[self.update_sys_script]])
 
 	def restart_gui(self):
 		logging.info("RESTART ZYNTHIAN-UI")
@@ -25,8 +25,10 @@
 
 import board
 import logging
+import weakref
 import traceback
 import neopixel_spi as neopixel
+from threading import Thread, Condition
 
 # Zynthian specific modules
 from zyngui import zynthian_gui_config
@@ -53,6 +55,23 @@ class zynthian_wsleds_base:
 		self.pulse_step = 0
 		self.last_wsled_state = ""
 		self.brightness = 1
+		# Shadow copy of the colors pushed to the strip, to skip redundant writes
+		self.wsled_colors = []
+		self.wsled_dirty = False
+		# Fixed-color LEDs, written once instead of on every tick
+		self.wsled_static_colors = {}
+		self.wsled_static_dirty = True
+		# Resolved per-screen update_wsleds callables, keyed by screen object
+		self.screen_update_fns = weakref.WeakKeyDictionary()
+		# Raised by invalidate() when LED-relevant state changed out-of-band,
+		# forcing the next tick to recompute even if the polled state matches
+		self.update_pending = True
+		# Background flush: the update thread hands a frame copy to a worker
+		# so it never waits on the strip refresh
+		self.flush_thread = None
+		self.flush_cond = Condition()
+		self.flush_flag = False
+		self.flush_frame = []
 		self.setup_colors()
 
 	def setup_colors(self):
@@ -103,6 +122,8 @@ class zynthian_wsleds_base:
 		else:
 			self.brightness = brightness
 		self.setup_colors()
+		# Repaint everything at the new brightness right away
+		self.invalidate()
 
 	def get_brightness(self):
 		return self.brightness
@@ -112,6 +133,11 @@ class zynthian_wsleds_base:
 			try:
 				self.spi_board = board.SPI()
 				self.wsleds = neopixel.NeoPixel_SPI(self.spi_board, self.num_leds, pixel_order=neopixel.GRB, auto_write=False, frequency=self.spi_freq)
+				self.wsled_colors = [None] * self.num_leds
+				self.flush_thread = Thread(target=self.flush_thread_task, args=())
+				self.flush_thread.name = "wsleds_flush"
+				self.flush_thread.daemon = True  # thread dies with the program
+				self.flush_thread.start()
 				self.light_on_all()
 			except Exception as e:
 				self.wsleds = None
@@ -119,36 +145,75 @@ class zynthian_wsleds_base:
 
 	def end(self):
 		self.light_off_all()
+		# Give the flush thread a chance to actually switch the LEDs off
+		with self.flush_cond:
+			self.flush_cond.wait_for(lambda: not self.flush_flag, timeout=0.2)
 
 	def get_num(self):
 		return self.num_leds
 
 	def set_led(self, i, wscolor):
-		self.wsleds[i] = wscolor
+		if self.wsled_colors[i] != wscolor:
+			self.wsled_colors[i] = wscolor
+			self.wsled_dirty = True
+
+	def push_frame(self):
+		if self.flush_thread is None:
+			# No worker yet (startup): push synchronously
+			self.wsleds[0:self.num_leds] = self.wsled_colors
+			self.wsleds.show()
+		else:
+			# Hand a copy of the frame to the flush thread and return without
+			# waiting on the strip refresh
+			with self.flush_cond:
+				self.flush_frame = list(self.wsled_colors)
+				self.flush_flag = True
+				self.flush_cond.notify()
+		self.wsled_dirty = False
+
+	def flush_thread_task(self):
+		while True:
+			with self.flush_cond:
+				while not self.flush_flag:
+					self.flush_cond.wait()
+				frame = self.flush_frame
+				self.flush_flag = False
+				self.flush_cond.notify_all()
+			try:
+				# Push the whole frame with one slice assignment: a single
+				# C-level call instead of one FFI call per touched pixel
+				self.wsleds[0:self.num_leds] = frame
+				self.wsleds.show()
+			except Exception as e:
+				logging.error(f"Can't refresh RGB LEDs => {e}")
 
 	def get_led(self, i):
-		color = self.wsleds[i]
-		return (int(color[0]) << 16) | (int(color[1]) << 8) | int(color[2])
+		# Read the shadow copy: saves unpacking the strip buffer per LED
+		color = self.wsled_colors[i]
+		if color is None:
+			color = self.wsleds[i]
+			return (int(color[0]) << 16) | (int(color[1]) << 8) | int(color[2])
+		return color
 
 	def light_on_all(self):
 		if self.num_leds > 0:
 			# Light all LEDs
 			for i in range(0, self.num_leds):
-				self.wsleds[i] = self.wscolor_default
-			self.wsleds.show()
+				self.set_led(i, self.wscolor_default)
+			self.push_frame()
 
 	def light_off_all(self):
 		if self.num_leds > 0:
 			# Light-off all LEDs
 			for i in range(0, self.num_leds):
-				self.wsleds[i] = self.wscolor_off
-			self.wsleds.show()
+				self.set_led(i, self.wscolor_off)
+			self.push_frame()
 
 	def blink(self, i, color):
 		if self.blink_state:
-			self.wsleds[i] = color
+			self.set_led(i, color)
 		else:
-			self.wsleds[i] = self.wscolor_off
+			self.set_led(i, self.wscolor_off)
 
 	def pulse(self, i):
 		if self.blink_state:
@@ -161,7 +226,7 @@ class zynthian_wsleds_base:
 			color = self.wscolor_off
 			self.pulse_step = 0
 
-		self.wsleds[i] = color
+		self.set_led(i, color)
 
 	def update(self):
 		# Power Save Mode
@@ -170,10 +235,17 @@ class zynthian_wsleds_base:
 				self.blink_state = True
 			else:
 				self.blink_state = False
-			for i in range(0, self.num_leds):
-				self.wsleds[i] = self.wscolor_off
+			self.wsled_dirty = False
+			for i in range(1, self.num_leds):
+				self.set_led(i, self.wscolor_off)
 			self.pulse(0)
-			self.wsleds.show()
+			if self.wsled_dirty:
+				self.push_frame()
+			# The whole frame must be recomputed when leaving power save:
+			# statics rewritten and any fast-path skip suppressed, since the
+			# blanked LEDs no longer match the last computed state
+			self.wsled_static_dirty = True
+			self.update_pending = True
 
 		# Normal mode
 		else:
@@ -181,11 +253,15 @@ class zynthian_wsleds_base:
 				self.blink_state = True
 			else:
 				self.blink_state = False
+			self.wsled_dirty = False
+			if self.wsled_static_dirty:
+				self.write_static_leds()
 			try:
 				self.update_wsleds()
 			except Exception as e:
 				logging.exception(traceback.format_exc())
-			self.wsleds.show()
+			if self.wsled_dirty:
+				self.push_frame()
 
 			if self.zyngui.capture_log_fname:
 				try:
@@ -204,9 +280,43 @@ class zynthian_wsleds_base:
 
 		self.blink_count += 1
 
+	def invalidate(self):
+		self.update_pending = True
+
+	def write_static_leds(self):
+		for i, color in self.wsled_static_colors.items():
+			self.set_led(i, color)
+		self.wsled_static_dirty = False
+
 	def reset_last_state(self):
 		self.last_wsled_state = ""
 
+	def resolve_update_wsleds(self, screen_obj):
+		# Cache the getattr lookup: it runs at LED refresh rate
+		if screen_obj is None:
+			return None
+		try:
+			# Hooks installed on the instance are swapped per widget by the
+			# control screen (set_current_widget), so read them live and only
+			# cache the class-level fallback
+			fn = vars(screen_obj).get("update_wsleds")
+			if callable(fn):
+				return fn
+		except TypeError:
+			pass
+		try:
+			return self.screen_update_fns[screen_obj]
+		except (KeyError, TypeError):
+			pass
+		fn = getattr(screen_obj, "update_wsleds", None)
+		if not callable(fn):
+			fn = None
+		try:
+			self.screen_update_fns[screen_obj] = fn
+		except TypeError:
+			pass
+		return fn
+
 	def update_wsleds(self):
 		pass
 
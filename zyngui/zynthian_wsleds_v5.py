@@ -45,111 +45,95 @@ class zynthian_wsleds_v5(zynthian_wsleds_base):
 		# + F1-F4 => 4, 11, 12, 19
 		self.custom_wsleds = [7, 8, 9, 10, 14, 16, 17, 18, 15, 13, 4, 11, 12, 19]
 
+	def setup_colors(self):
+		super().setup_colors()
+		# Screen-indicator LEDs: color per screen, wscolor_default otherwise.
+		# Rebuilt here so the table tracks brightness changes.
+		self.wsled_screen_colors = {
+			1: {"audio_mixer": self.wscolor_active, "alsa_mixer": self.wscolor_active2},
+			2: {"control": self.wscolor_active, "audio_player": self.wscolor_active,
+				"preset": self.wscolor_active2, "bank": self.wscolor_active2},
+			3: {"zs3": self.wscolor_active, "snapshot": self.wscolor_active2},
+			5: {"zynpad": self.wscolor_active, "pattern_editor": self.wscolor_active2},
+		}
+
 	def update_wsleds(self):
-		curscreen = self.zyngui.current_screen
-		curscreen_obj = self.zyngui.get_current_screen_obj()
+		# Hoist the zyngui state read at refresh rate to locals
+		zyngui = self.zyngui
+		state_manager = zyngui.state_manager
+		alt_mode = zyngui.alt_mode
+		blink_state = self.blink_state
+		set_led = self.set_led
+		curscreen = zyngui.current_screen
+		curscreen_obj = zyngui.get_current_screen_obj()
 
 		# Menu / Admin
-		if self.zyngui.is_current_screen_menu():
-			self.wsleds[0] = self.wscolor_active
-		elif self.zyngui.is_current_screen_admin():
-			self.wsleds[0] = self.wscolor_active2
+		if zyngui.is_current_screen_menu():
+			set_led(0, self.wscolor_active)
+		elif zyngui.is_current_screen_admin():
+			set_led(0, self.wscolor_active2)
 		else:
-			self.wsleds[0] = self.wscolor_default
+			set_led(0, self.wscolor_default)
 
-		# Audio Mixer / ALSA Mixer
-		if curscreen == "audio_mixer":
-			self.wsleds[1] = self.wscolor_active
-		elif curscreen == "alsa_mixer":
-			self.wsleds[1] = self.wscolor_active2
-		else:
-			self.wsleds[1] = self.wscolor_default
-
-		# Control / Preset Screen:
-		if curscreen in ("control", "audio_player"):
-			self.wsleds[2] = self.wscolor_active
-		elif curscreen in ("preset", "bank"):
-			self.wsleds[2] = self.wscolor_active2
-		else:
-			self.wsleds[2] = self.wscolor_default
-
-		# ZS3 / Snapshot:
-		if curscreen == "zs3":
-			self.wsleds[3] = self.wscolor_active
-		elif curscreen == "snapshot":
-			self.wsleds[3] = self.wscolor_active2
-		else:
-			self.wsleds[3] = self.wscolor_default
-
-		# Zynseq: Zynpad /Pattern Editor
-		if curscreen == "zynpad":
-			self.wsleds[5] = self.wscolor_active
-		elif curscreen == "pattern_editor":
-			self.wsleds[5] = self.wscolor_active2
-		else:
-			self.wsleds[5] = self.wscolor_default
+		# Screen-indicator LEDs: Mixer, Control/Preset, ZS3/Snapshot, Zynseq
+		for led, colors in self.wsled_screen_colors.items():
+			set_led(led, colors.get(curscreen, self.wscolor_default))
 
 		# Tempo Screen
 		if curscreen == "tempo":
-			self.wsleds[6] = self.wscolor_active
-		elif self.zyngui.state_manager.zynseq.libseq.isMetronomeEnabled():
-			self.blink(6, self.wscolor_active)
+			set_led(6, self.wscolor_active)
+		elif state_manager.zynseq.libseq.isMetronomeEnabled():
+			set_led(6, self.wscolor_active if blink_state else self.wscolor_off)
 		else:
-			self.wsleds[6] = self.wscolor_default
+			set_led(6, self.wscolor_default)
 
 		# ALT button:
-		if self.zyngui.alt_mode:
-			self.wsleds[7] = self.wscolor_alt
+		if alt_mode:
+			set_led(7, self.wscolor_alt)
 		else:
-			self.wsleds[7] = self.wscolor_default
+			set_led(7, self.wscolor_default)
 
-		if self.zyngui.alt_mode and curscreen != "midi_recorder":
-			self.zyngui.screens["midi_recorder"].update_wsleds(self.custom_wsleds)
+		if alt_mode and curscreen != "midi_recorder":
+			zyngui.screens["midi_recorder"].update_wsleds(self.custom_wsleds)
 		else:
 			# REC Button
-			if self.zyngui.state_manager.audio_recorder.rec_proc:
-				self.wsleds[8] = self.wscolor_red
+			if state_manager.audio_recorder.rec_proc:
+				set_led(8, self.wscolor_red)
 			else:
-				self.wsleds[8] = self.wscolor_default
+				set_led(8, self.wscolor_default)
 			# STOP button
-			self.wsleds[9] = self.wscolor_default
+			set_led(9, self.wscolor_default)
 			# PLAY button:
-			if self.zyngui.state_manager.status_audio_player:
-				self.wsleds[10] = self.wscolor_green
+			if state_manager.status_audio_player:
+				set_led(10, self.wscolor_green)
 			else:
-				self.wsleds[10] = self.wscolor_default
+				set_led(10, self.wscolor_default)
 
 		# Select/Yes button
-		self.wsleds[13] = self.wscolor_green
+		set_led(13, self.wscolor_green)
 
 		# Back/No button
-		self.wsleds[15] = self.wscolor_red
+		set_led(15, self.wscolor_red)
 
 		# Arrow buttons (Up, Left, Bottom, Right)
-		self.wsleds[14] = self.wscolor_yellow
-		self.wsleds[16] = self.wscolor_yellow
-		self.wsleds[17] = self.wscolor_yellow
-		self.wsleds[18] = self.wscolor_yellow
+		set_led(14, self.wscolor_yellow)
+		set_led(16, self.wscolor_yellow)
+		set_led(17, self.wscolor_yellow)
+		set_led(18, self.wscolor_yellow)
 
 		# F1-F4 buttons
-		if self.zyngui.alt_mode:
+		if alt_mode:
 			wscolor_fx = self.wscolor_alt
 		else:
 			wscolor_fx = self.wscolor_default
-		self.wsleds[4] = wscolor_fx
-		self.wsleds[11] = wscolor_fx
-		self.wsleds[12] = wscolor_fx
-		self.wsleds[19] = wscolor_fx
+		set_led(4, wscolor_fx)
+		set_led(11, wscolor_fx)
+		set_led(12, wscolor_fx)
+		set_led(19, wscolor_fx)
 
 		# Call current screen's update_wsleds() function to update the customizable LEDs
-		update_wsleds_func = getattr(curscreen_obj, "update_wsleds", None)
-		if callable(update_wsleds_func):
+		update_wsleds_func = self.resolve_update_wsleds(curscreen_obj)
+		if update_wsleds_func is not None:
 			update_wsleds_func(self.custom_wsleds)
 
-		# Refresh LED strip
-		try:
-			self.zyngui.screens[curscreen].update_wsleds()
-		except:
-			pass
-
 # ------------------------------------------------------------------------------
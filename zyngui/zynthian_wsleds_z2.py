@@ -31,6 +31,22 @@ from zyngui import zynthian_gui_config
 # Zynthian WSLeds class for Z2
 # ---------------------------------------------------------------------------
 
+# Chain ids mapped to the chain-select buttons, in LED order
+_CHAIN_IDS = (1, 2, 3, 4, 5, 0)
+
+# Small integer ids for the screens checked every tick: integer compares are
+# cheaper than repeated string compares in the hot path
+_SCR_CONTROL, _SCR_AUDIO_PLAYER, _SCR_PRESET, _SCR_BANK, _SCR_ZS3, _SCR_TEMPO, _SCR_MIDI_RECORDER = range(7)
+_SCREEN_IDS = {
+	"control": _SCR_CONTROL,
+	"audio_player": _SCR_AUDIO_PLAYER,
+	"preset": _SCR_PRESET,
+	"bank": _SCR_BANK,
+	"zs3": _SCR_ZS3,
+	"tempo": _SCR_TEMPO,
+	"midi_recorder": _SCR_MIDI_RECORDER,
+}
+
 
 class zynthian_wsleds_z2(zynthian_wsleds_base):
 	
@@ -44,144 +60,169 @@ class zynthian_wsleds_z2(zynthian_wsleds_base):
 		# + BACK/SEL => 18, 20
 		# + F1-F5 => 8, 9, 10, 11, 12 (display's bottom buttons)
 		self.custom_wsleds = [13, 14, 17, 15, 19, 21, 22, 23, 18, 20, 8, 9, 10, 11, 12]
+		self.last_static_screen = None
+		# Scalar inputs of the last computed frame, for the fast-path skip
+		self.last_state_key = None
+
+	def setup_colors(self):
+		super().setup_colors()
+		# Screen-indicator LEDs: color per screen, wscolor_default otherwise.
+		# Rebuilt here so the table tracks brightness changes.
+		self.wsled_screen_colors = {
+			8: {"zynpad": self.wscolor_active},
+			9: {"pattern_editor": self.wscolor_active, "arranger": self.wscolor_active2},
+			11: {"zs3": self.wscolor_active, "snapshot": self.wscolor_active2},
+			24: {"audio_mixer": self.wscolor_active, "alsa_mixer": self.wscolor_active2},
+		}
+		# Fixed-color LEDs: Back/Sel, arrows and the unused F5 slot
+		self.wsled_static_colors = {
+			12: self.wscolor_default,
+			18: self.wscolor_red,
+			19: self.wscolor_yellow,
+			20: self.wscolor_green,
+			21: self.wscolor_yellow,
+			22: self.wscolor_yellow,
+			23: self.wscolor_yellow,
+		}
+		self.wsled_static_dirty = True
 
 	def update_wsleds(self):
-		curscreen = self.zyngui.current_screen
-		curscreen_obj = self.zyngui.get_current_screen_obj()
+		# Hoist the zyngui state read at refresh rate to locals
+		zyngui = self.zyngui
+		state_manager = zyngui.state_manager
+		chain_manager = zyngui.chain_manager
+		alt_mode = zyngui.alt_mode
+		blink_state = self.blink_state
+		set_led = self.set_led
+		wscolor_off = self.wscolor_off
+		wscolor_default = self.wscolor_default
+		wscolor_active = self.wscolor_active
+		wscolor_active2 = self.wscolor_active2
+		curscreen = zyngui.current_screen
+		sid = _SCREEN_IDS.get(curscreen, -1)
+		curscreen_obj = zyngui.get_current_screen_obj()
+		update_wsleds_func = self.resolve_update_wsleds(curscreen_obj)
+		active_chain_id = chain_manager.active_chain_id
+		# Chain presence in one pass over the chains dict, shared by the
+		# state key and the chain-button loop below
+		chains = chain_manager.chains
+		chains_present = tuple(chain_id in chains for chain_id in _CHAIN_IDS)
+		active_has_procs = chain_manager.get_processor_count(active_chain_id) > 0
+
+		# Fast path: if the scalar inputs match the last computed frame and
+		# nothing blinks or repaints out of band, the frame cannot change
+		status_rec = bool(state_manager.audio_recorder.rec_proc)
+		status_play = bool(state_manager.status_audio_player)
+		midi_learn = state_manager.midi_learn_zctrl is not None
+		state_key = (
+			curscreen, alt_mode, blink_state, active_chain_id,
+			chains_present,
+			active_has_procs,
+			status_rec,
+			status_play,
+			midi_learn,
+			bool(state_manager.zynseq.libseq.isMetronomeEnabled()),
+			zyngui.current_processor.show_fav_presets if sid == _SCR_PRESET or sid == _SCR_BANK else False,
+		)
+		if state_key == self.last_state_key and not self.update_pending \
+				and not alt_mode and update_wsleds_func is None:
+			return
+		self.last_state_key = state_key
+		self.update_pending = False
+
+		# Restore the fixed-color LEDs when the screen changes: the previous
+		# screen's handler may have repainted some of them
+		if curscreen != self.last_static_screen:
+			self.last_static_screen = curscreen
+			self.write_static_leds()
 
 		# Menu
-		if self.zyngui.is_current_screen_menu():
-			self.wsleds[0] = self.wscolor_active
-		elif self.zyngui.is_current_screen_admin():
-			self.wsleds[0] = self.wscolor_active2
+		if zyngui.is_current_screen_menu():
+			set_led(0, wscolor_active)
+		elif zyngui.is_current_screen_admin():
+			set_led(0, wscolor_active2)
 		else:
-			self.wsleds[0] = self.wscolor_default
+			set_led(0, wscolor_default)
 
 		# Active Chain
-		if self.zyngui.alt_mode:
+		if alt_mode:
 			wscolor_light = self.wscolor_alt
 		else:
-			wscolor_light = self.wscolor_default
+			wscolor_light = wscolor_default
 
 		# => Light non-empty chains
-		for i, chain_id in enumerate([1, 2, 3, 4, 5, 0]):
-			if self.zyngui.chain_manager.get_chain(chain_id) is None:
-				self.wsleds[i + 1] = self.wscolor_off
+		for i, chain_id in enumerate(_CHAIN_IDS):
+			if not chains_present[i]:
+				set_led(i + 1, wscolor_off)
 			else:
-				if self.zyngui.chain_manager.active_chain_id == chain_id:
+				if active_chain_id == chain_id:
 					# => Light active chain
-					if curscreen == "control":
-						self.wsleds[i + 1] = self.wscolor_active
+					if sid == _SCR_CONTROL:
+						set_led(i + 1, wscolor_active)
 					else:
-						if self.zyngui.chain_manager.get_processor_count(chain_id):
-							self.blink(i + 1, self.wscolor_active)
+						if active_has_procs:
+							set_led(i + 1, wscolor_active if blink_state else wscolor_off)
 						else:
-							self.blink(i + 1, self.wscolor_active2)
+							set_led(i + 1, wscolor_active2 if blink_state else wscolor_off)
 				else:
-					self.wsleds[i + 1] = wscolor_light
+					set_led(i + 1, wscolor_light)
 
 		# MODE button => MIDI LEARN
-		if self.zyngui.state_manager.get_midi_learn_zctrl() or curscreen == "zs3":
-			self.wsleds[7] = self.wscolor_yellow
-		elif self.zyngui.state_manager.midi_learn_zctrl:
-			self.wsleds[7] = self.wscolor_active
-		else:
-			self.wsleds[7] = self.wscolor_default
-
-		# Zynpad screen:
-		if curscreen == "zynpad":
-			self.wsleds[8] = self.wscolor_active
+		if midi_learn or sid == _SCR_ZS3:
+			set_led(7, self.wscolor_yellow)
 		else:
-			self.wsleds[8] = self.wscolor_default
+			set_led(7, wscolor_default)
 
-		# Pattern Editor/Arranger screen:
-		if curscreen == "pattern_editor":
-			self.wsleds[9] = self.wscolor_active
-		elif curscreen == "arranger":
-			self.wsleds[9] = self.wscolor_active2
-		else:
-			self.wsleds[9] = self.wscolor_default
+		# Screen-indicator LEDs: Zynpad, Pattern/Arranger, ZS3/Snapshot, Mixer
+		for led, colors in self.wsled_screen_colors.items():
+			set_led(led, colors.get(curscreen, wscolor_default))
 
 		# Control / Preset Screen:
-		if curscreen in ("control", "audio_player"):
-			self.wsleds[10] = self.wscolor_active
-		elif curscreen in ("preset", "bank"):
-			if self.zyngui.current_processor.get_show_fav_presets():
-				self.blink(10, self.wscolor_active2)
+		if sid == _SCR_CONTROL or sid == _SCR_AUDIO_PLAYER:
+			set_led(10, wscolor_active)
+		elif sid == _SCR_PRESET or sid == _SCR_BANK:
+			if zyngui.current_processor.show_fav_presets:
+				set_led(10, wscolor_active2 if blink_state else wscolor_off)
 			else:
-				self.wsleds[10] = self.wscolor_active2
+				set_led(10, wscolor_active2)
 		else:
-			self.wsleds[10] = self.wscolor_default
-
-		# ZS3/Snapshot screen:
-		if curscreen == "zs3":
-			self.wsleds[11] = self.wscolor_active
-		elif curscreen == "snapshot":
-			self.wsleds[11] = self.wscolor_active2
-		else:
-			self.wsleds[11] = self.wscolor_default
-
-		# ???:
-		self.wsleds[12] = self.wscolor_default
+			set_led(10, wscolor_default)
 
 		# ALT button:
-		if self.zyngui.alt_mode:
-			self.wsleds[13] = self.wscolor_alt
+		if alt_mode:
+			set_led(13, self.wscolor_alt)
 		else:
-			self.wsleds[13] = self.wscolor_default
+			set_led(13, wscolor_default)
 
-		if self.zyngui.alt_mode and curscreen != "midi_recorder":
-			self.zyngui.screens["midi_recorder"].update_wsleds(wsleds)
+		if alt_mode and sid != _SCR_MIDI_RECORDER:
+			# ALT mode: the MIDI-recorder handler owns the transport LEDs
+			zyngui.screens["midi_recorder"].update_wsleds(self.custom_wsleds)
 		else:
+			# Default transport LEDs: screen handlers that own them repaint
+			# right after, before the frame is pushed
 			# REC Button
-			if self.zyngui.state_manager.audio_recorder.rec_proc:
-				self.wsleds[14] = self.wscolor_red
+			if status_rec:
+				set_led(14, self.wscolor_red)
 			else:
-				self.wsleds[14] = self.wscolor_default
+				set_led(14, wscolor_default)
 			# STOP button
-			self.wsleds[17] = self.wscolor_default
+			set_led(17, wscolor_default)
 			# PLAY button:
-			if self.zyngui.state_manager.status_audio_player:
-				self.wsleds[15] = self.wscolor_green
+			if status_play:
+				set_led(15, self.wscolor_green)
 			else:
-				self.wsleds[15] = self.wscolor_default
+				set_led(15, wscolor_default)
 
 		# Tempo Screen
-		if curscreen == "tempo":
-			self.wsleds[16] = self.wscolor_active
-		elif self.zyngui.state_manager.zynseq.libseq.isMetronomeEnabled():
-			self.blink(16, self.wscolor_active)
+		if sid == _SCR_TEMPO:
+			set_led(16, wscolor_active)
+		elif state_manager.zynseq.libseq.isMetronomeEnabled():
+			set_led(16, wscolor_active if blink_state else wscolor_off)
 		else:
-			self.wsleds[16] = self.wscolor_default
-
-		# Select/Yes button
-		self.wsleds[20] = self.wscolor_green
-
-		# Back/No button
-		self.wsleds[18] = self.wscolor_red
-
-		# Arrow buttons (Up, Left, Bottom, Right)
-		self.wsleds[19] = self.wscolor_yellow
-		self.wsleds[21] = self.wscolor_yellow
-		self.wsleds[22] = self.wscolor_yellow
-		self.wsleds[23] = self.wscolor_yellow
-
-		# Audio Mixer / ALSA Mixer
-		if curscreen == "audio_mixer":
-			self.wsleds[24] = self.wscolor_active
-		elif curscreen == "alsa_mixer":
-			self.wsleds[24] = self.wscolor_active2
-		else:
-			self.wsleds[24] = self.wscolor_default
+			set_led(16, wscolor_default)
 
 		# Call current screen's update_wsleds() function to update the customizable LEDs
-		update_wsleds_func = getattr(curscreen_obj, "update_wsleds", None)
-		if callable(update_wsleds_func):
+		if update_wsleds_func is not None:
 			update_wsleds_func(self.custom_wsleds)
 
-		try:
-			self.zyngui.screens[curscreen].update_wsleds()
-		except:
-			pass
-
 # ------------------------------------------------------------------------------